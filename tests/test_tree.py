@@ -0,0 +1,138 @@
+import asyncio
+import errno
+import json
+import os
+
+import pathspec
+import pytest
+
+import tree
+
+
+def test_read_gitignore(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.log\n")
+
+    gitignore = tree.read_gitignore(str(tmp_path))
+
+    assert tree.should_ignore("a.log", "", False, gitignore)
+    assert not tree.should_ignore("a.py", "", False, gitignore)
+
+
+@pytest.mark.parametrize(
+    "lines",
+    [
+        ["*.log", "!important.log"],
+        ["!important.log", "*.log"],
+        ["*.log", "!*.log", "*.log"],
+        ["build/"],
+        ["/build"],
+        ["/build/"],
+        ["a/**/b", "**/c", "d/**"],
+        ["build/", "!build/keep.txt"],
+        ["build", "!build/", "build/keep.txt"],
+        ["a/", "!a/b/", "a/b/*.log", "!a/b/important.log"],
+    ],
+)
+def test_should_ignore_matches_pathspec(tmp_path, lines):
+    (tmp_path / ".gitignore").write_text("\n".join(lines) + "\n")
+    gitignore = tree.read_gitignore(str(tmp_path))
+    spec = pathspec.PathSpec.from_lines("gitwildmatch", lines)
+
+    names = ["a", "b", "c", "d", "build", "keep.txt", "x.log", "important.log"]
+    rel_dirs = ["", "a/", "build/", "a/b/", "x/build/", "a/x/b/", "d/c/"]
+    for rel_dir in rel_dirs:
+        for name in names:
+            for is_dir in (False, True):
+                path = rel_dir + name + ("/" if is_dir else "")
+                expected = spec.match_file(path)
+                assert (
+                    tree.should_ignore(name, rel_dir, is_dir, gitignore) == expected
+                ), path
+
+
+def test_read_gitignore_missing(tmp_path):
+    assert tree.read_gitignore(str(tmp_path)) is None
+
+
+def test_read_gitignore_symlink_loop(tmp_path):
+    os.symlink(".gitignore", tmp_path / ".gitignore")
+
+    assert tree.read_gitignore(str(tmp_path)) is None
+
+
+def test_read_gitignore_name_too_long(tmp_path):
+    assert tree.read_gitignore(str(tmp_path / ("x" * 300))) is None
+
+
+def test_read_gitignore_null_byte(tmp_path):
+    assert tree.read_gitignore(str(tmp_path) + "\0") is None
+
+
+def test_get_src_tree(tmp_path):
+    (tmp_path / "a.py").touch()
+
+    result = json.loads(asyncio.run(tree.get_src_tree(str(tmp_path))))
+
+    assert result["children"] == [{"name": "a.py", "type": "file"}]
+
+
+def test_get_src_tree_not_found(tmp_path):
+    os.symlink("loop", tmp_path / "loop")
+    not_found = json.dumps({"error": "directory not found"}, indent=2)
+
+    for directory in (
+        tmp_path / "missing",
+        tmp_path / "loop",
+        tmp_path / ("x" * 300),
+        str(tmp_path) + "\0",
+    ):
+        assert asyncio.run(tree.get_src_tree(str(directory))) == not_found
+        assert asyncio.run(tree.src_tree(str(directory))) == not_found
+
+
+@pytest.mark.parametrize("max_workers", [1, 8])
+def test_dump_tree_matches_json_dumps(tmp_path, monkeypatch, max_workers):
+    monkeypatch.setattr(tree, "orjson", None)
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    root = tmp_path / "root"
+    (root / "a" / "b" / "c" / "d").mkdir(parents=True)
+    (root / "a" / "b" / "c" / "d" / "deep.txt").touch()
+    (root / "a" / "empty").mkdir()
+    (root / "a" / "z.txt").touch()
+    (root / "e").mkdir()
+    for name in ('quote".txt', "back\\slash.txt", "tab\t.txt", "ü名.txt"):
+        (root / name).touch()
+
+    for path in (empty, root, root / "a" / "z.txt"):
+        expected = json.dumps(
+            tree.build_tree(str(path), max_workers=max_workers),
+            indent=2,
+            ensure_ascii=False,
+        )
+        assert tree.dump_tree(str(path), max_workers=max_workers) == expected
+
+
+def test_read_gitignore_unreadable_not_cached(tmp_path, monkeypatch):
+    (tmp_path / ".gitignore").write_text("*.log\n")
+
+    def denied(*args, **kwargs):
+        raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr(tree, "open", denied, raising=False)
+    assert tree.read_gitignore(str(tmp_path)) is None
+
+    monkeypatch.delattr(tree, "open")
+    gitignore = tree.read_gitignore(str(tmp_path))
+    assert tree.should_ignore("a.log", "", False, gitignore)
+
+
+def test_get_src_tree_other_errors_propagate(tmp_path, monkeypatch):
+    def too_many_files(*args, **kwargs):
+        raise OSError(errno.EMFILE, "Too many open files")
+
+    monkeypatch.setattr(tree, "_list_dir", too_many_files)
+
+    with pytest.raises(OSError) as excinfo:
+        asyncio.run(tree.get_src_tree(str(tmp_path)))
+    assert excinfo.value.errno == errno.EMFILE
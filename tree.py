@@ -1,115 +1,571 @@
 import asyncio
+import errno
 import json
 import os
+import re
 import sys
-from typing import Any, Dict, Optional
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from json.encoder import encode_basestring
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import pathspec
 from mcp.server.fastmcp import FastMCP
 
+try:
+    import orjson
+except ImportError:  # optional, installed with the "fast" extra
+    orjson = None
+
 # Initialize FastMCP server
 mcp = FastMCP("src-tree")
 
+# Number of threads scanning subdirectories of the root concurrently
+MAX_WORKERS = 8
+
+# Entry names shorter than this are interned
+INTERN_MAX_LENGTH = 32
+
+# Node types in the tree
+_FILE = "file"
+_DIR = "directory"
+
+# Number of compiled .gitignore files kept in memory
+GITIGNORE_CACHE_SIZE = 64
+
+# Compiled .gitignore patterns keyed by (path, st_mtime_ns, st_size)
+_gitignore_cache: OrderedDict[Tuple[str, int, int], Optional[re.Pattern]] = (
+    OrderedDict()
+)
+_gitignore_cache_lock = threading.Lock()
+
+# Named groups in regexes generated by pathspec
+_NAMED_GROUP = re.compile(r"\(\?P<\w+>")
+
 
-def read_gitignore(base_path: str) -> Optional[pathspec.PathSpec]:
+def read_gitignore(base_path: str) -> Optional[re.Pattern]:
     """
-    Read .gitignore file and return a PathSpec object
+    Read .gitignore file and return its compiled patterns
+
+    Compiled patterns are cached by the file's path, modification time and
+    size, so repeated requests for the same directory skip reading and
+    compiling .gitignore until it changes.
 
     Args:
         base_path: Base directory path containing .gitignore
 
     Returns:
-        PathSpec object, or None if .gitignore doesn't exist
+        Compiled regex, or None if .gitignore doesn't exist or has no patterns
     """
-    gitignore_path = os.path.join(base_path, ".gitignore")
-    if not os.path.exists(gitignore_path):
+    gitignore_path = os.path.abspath(os.path.join(base_path, ".gitignore"))
+    try:
+        st = os.stat(gitignore_path)
+    except (OSError, ValueError):
+        # Same cases os.path.exists() treats as missing: unreachable,
+        # symlink loops, names too long or containing a null byte
         return None
 
-    with open(gitignore_path, "r") as f:
-        # Remove empty lines and comments
-        lines = [
-            line.strip()
-            for line in f.readlines()
-            if line.strip() and not line.startswith("#")
-        ]
-        gitignore = pathspec.PathSpec.from_lines(
-            pathspec.patterns.GitWildMatchPattern, lines
-        )
+    key = (gitignore_path, st.st_mtime_ns, st.st_size)
+    with _gitignore_cache_lock:
+        if key in _gitignore_cache:
+            _gitignore_cache.move_to_end(key)
+            return _gitignore_cache[key]
+
+    try:
+        gitignore = _compile_gitignore(gitignore_path)
+    except OSError:
+        # Unreadable for now (e.g. permission denied): treat as no
+        # .gitignore, but don't cache it, since fixing the permissions
+        # changes neither mtime nor size
+        return None
+
+    with _gitignore_cache_lock:
+        _gitignore_cache[key] = gitignore
+        if len(_gitignore_cache) > GITIGNORE_CACHE_SIZE:
+            _gitignore_cache.popitem(last=False)
     return gitignore
 
 
+def _compile_gitignore(gitignore_path: str) -> Optional[re.Pattern]:
+    """
+    Compile the patterns of a .gitignore file into a single regex
+
+    Patterns are joined as one alternation in reverse order, so the first
+    alternative that matches is the last matching line of .gitignore, as in
+    git. Negated patterns are wrapped in a named group, which makes
+    ``match.lastgroup`` tell whether a match re-includes the path.
+
+    Args:
+        gitignore_path: Path of the .gitignore file
+
+    Returns:
+        Compiled regex, or None if .gitignore has no patterns
+
+    Raises:
+        OSError: If .gitignore can't be read
+    """
+    alternatives = []
+    with open(gitignore_path, "r", encoding="utf-8", errors="replace") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            # Skip empty lines and comments
+            if not line or line[0] == "#":
+                continue
+            regex, include = pathspec.patterns.GitWildMatchPattern.pattern_to_regex(
+                line
+            )
+            if include is None:
+                continue
+            # Drop pathspec's own named groups so the fragments can be combined
+            regex = _NAMED_GROUP.sub("(?:", regex)
+            if not include:
+                regex = f"(?P<n{index}>{regex})"
+            alternatives.append(regex)
+
+    if not alternatives:
+        return None
+    return re.compile("|".join(reversed(alternatives)))
+
+
 def should_ignore(
-    path: str, base_path: str, gitignore: Optional[pathspec.PathSpec] = None
+    name: str,
+    rel_dir: str,
+    is_dir: bool,
+    gitignore: Optional[re.Pattern] = None,
 ) -> bool:
     """
-    Determine if the specified path should be ignored
+    Determine if the specified entry should be ignored
 
     Args:
-        path: Path to check
-        base_path: Base directory path containing .gitignore
-        gitignore: PathSpec object from .gitignore
+        name: Name of the entry
+        rel_dir: Relative path of the parent directory from the directory
+            containing .gitignore, ending with "/" ("" at the top level)
+        is_dir: Whether the entry is a directory
+        gitignore: Compiled .gitignore patterns from read_gitignore
 
     Returns:
-        True if path should be ignored
+        True if the entry should be ignored
     """
     # Ignore directories starting with .
-    if os.path.isdir(path) and os.path.basename(path).startswith("."):
+    if is_dir and name.startswith("."):
         return True
 
-    # Check if path matches .gitignore rules
-    if gitignore:
-        relative_path = os.path.relpath(path, base_path)
-        # Add trailing slash for directories
-        if os.path.isdir(path):
-            relative_path = relative_path + os.sep
-        # Normalize path (unify slashes)
-        relative_path = relative_path.replace(os.sep, "/")
-        if gitignore.match_file(relative_path):
-            return True
+    # Without .gitignore there are no patterns to match
+    if gitignore is None:
+        return False
+
+    # Check if path matches .gitignore rules. rel_dir already ends with "/",
+    # and directories get a trailing slash so that directory-only rules such
+    # as "__pycache__/" match them
+    relative_path = rel_dir + name + "/" if is_dir else rel_dir + name
+    match = gitignore.match(relative_path)
+    # A match on a negated pattern (named group) re-includes the path
+    return match is not None and match.lastgroup is None
+
 
-    return False
+def _list_dir(path: str, sort: bool = True) -> List[os.DirEntry]:
+    """
+    List directory entries, sorted by name unless disabled
+
+    Args:
+        path: Directory path to list
+        sort: Whether to sort entries by name
+
+    Returns:
+        DirEntry list
+
+    Raises:
+        OSError: If the directory can't be opened
+    """
+    with os.scandir(path) as it:
+        if sort:
+            return sorted(it, key=attrgetter("name"))
+        return list(it)
+
+
+def _list_subdir(path: str, sort: bool = True) -> List[os.DirEntry]:
+    """
+    List entries of a directory found during the walk
+
+    Args:
+        path: Directory path to list
+        sort: Whether to sort entries by name
+
+    Returns:
+        DirEntry list, or an empty list if the directory can't be read
+        (permission denied, or removed since its parent was listed)
+    """
+    try:
+        return _list_dir(path, sort)
+    except OSError:
+        return []
+
+
+def _list_root(path: str, sort: bool = True) -> List[os.DirEntry]:
+    """
+    List entries of the root directory of a walk
+
+    The root is opened directly rather than checked first, so a directory
+    costs no stat() before it is listed. Unlike entries, a symlink given as
+    the root is followed.
+
+    Args:
+        path: Root directory path
+        sort: Whether to sort entries by name
+
+    Returns:
+        DirEntry list, or an empty list if permission is denied
+
+    Raises:
+        FileNotFoundError: If path can't be resolved, in the cases where
+            os.path.exists() reports False: no such path, a symlink loop,
+            a name too long or containing a null byte
+        NotADirectoryError: If path is not a directory
+    """
+    try:
+        return _list_dir(path, sort)
+    except PermissionError:
+        return []
+    except NotADirectoryError:
+        # Also raised when a parent component is a file; only a root that
+        # isn't a directory pays for this stat()
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), path
+            ) from None
+        raise
+    except ValueError:
+        # Embedded null byte
+        raise FileNotFoundError(
+            errno.ENOENT, os.strerror(errno.ENOENT), path
+        ) from None
+    except OSError as e:
+        if e.errno in (errno.ELOOP, errno.ENAMETOOLONG):
+            raise FileNotFoundError(e.errno, e.strerror, path) from None
+        raise
+
+
+def _walk(
+    entries: List[os.DirEntry],
+    gitignore: Optional[re.Pattern] = None,
+    rel_dir: str = "",
+    sort: bool = True,
+) -> Iterator[Tuple[int, str, bool]]:
+    """
+    Walk a directory depth-first, skipping ignored entries
+
+    Entries are yielded in pre-order, which is the order they appear in the
+    output tree. The walk uses an explicit stack, so deeply nested
+    directories cannot hit the recursion limit, and ignored directories are
+    never opened.
+
+    Like git, symbolic links are not followed: a link to a directory is
+    listed as a file. Entry types come from the d_type that readdir reports,
+    so entries are not stat'ed on filesystems that provide it.
+
+    Args:
+        entries: Entries of the directory to traverse, from _list_dir
+        gitignore: Compiled .gitignore patterns from read_gitignore
+        rel_dir: Path of the directory relative to the .gitignore base,
+            ending with "/" ("" for the base itself)
+        sort: Whether to sort children by name (otherwise directory order)
+
+    Yields:
+        (depth, name, is_dir) for each entry, depth 1 being the root's children
+    """
+    # Each frame holds the remaining entries of a directory, its path
+    # relative to the .gitignore base and the depth of its entries
+    stack = [(iter(entries), rel_dir, 1)]
+
+    # Local names for everything used per entry
+    push = stack.append
+    list_dir = _list_subdir
+    ignore = should_ignore
+    intern = sys.intern
+    intern_max_length = INTERN_MAX_LENGTH
+
+    while stack:
+        entries, rel_dir, depth = stack[-1]
+        for entry in entries:
+            name = entry.name
+            # Basenames such as "__init__.py" or "src" repeat all over a
+            # tree; interning lets every node share one string
+            if len(name) < intern_max_length:
+                name = intern(name)
+            # DirEntry caches the file type from readdir, so no extra stat() is needed
+            is_dir = entry.is_dir(follow_symlinks=False)
+            # Every entry is matched even below kept directories, since
+            # patterns such as "*.log" apply at any depth; ignored
+            # directories are simply never pushed, so nothing below them
+            # is matched again
+            if ignore(name, rel_dir, is_dir, gitignore):
+                continue
+
+            yield depth, name, is_dir
+            if is_dir:
+                # Descend now; the parent's iterator resumes once this is done
+                push(
+                    (
+                        iter(list_dir(entry.path, sort)),
+                        rel_dir + name + "/",
+                        depth + 1,
+                    )
+                )
+                break
+        else:
+            stack.pop()
+
+
+def _scan(
+    path: str, gitignore: Optional[re.Pattern], rel_dir: str, sort: bool
+) -> Tuple[array, List[str], bytearray]:
+    """
+    Walk a directory into parallel arrays
+
+    Keeping a subtree as arrays of depths, names and directory flags takes
+    far less memory than a list of (depth, name, is_dir) tuples while it
+    waits to be yielded by _walk_tree.
+
+    Args:
+        path: Directory path to traverse
+        gitignore: Compiled .gitignore patterns from read_gitignore
+        rel_dir: Path of the directory relative to the .gitignore base,
+            ending with "/"
+        sort: Whether to sort children by name (otherwise directory order)
+
+    Returns:
+        Depths, names and directory flags of the entries, in _walk order
+    """
+    depths = array("I")
+    names = []
+    dirs = bytearray()
+    add_depth = depths.append
+    add_name = names.append
+    add_dir = dirs.append
+    walk = _walk(_list_subdir(path, sort), gitignore, rel_dir, sort)
+    for depth, name, is_dir in walk:
+        add_depth(depth)
+        add_name(name)
+        add_dir(is_dir)
+    return depths, names, dirs
+
+
+def _walk_tree(
+    entries: List[os.DirEntry],
+    gitignore: Optional[re.Pattern] = None,
+    max_workers: int = MAX_WORKERS,
+    sort: bool = True,
+) -> Iterator[Tuple[int, str, bool]]:
+    """
+    Walk a directory like _walk, scanning its subdirectories concurrently
+
+    Each subdirectory of the root is walked in a thread pool (scandir
+    releases the GIL while it waits on the filesystem), and the results are
+    yielded in the same order as _walk.
+
+    Args:
+        entries: Entries of the root directory, from _list_dir
+        gitignore: Compiled .gitignore patterns from read_gitignore
+        max_workers: Number of threads; 1 or less walks in the calling thread
+        sort: Whether to sort children by name (otherwise directory order)
+
+    Yields:
+        (depth, name, is_dir) for each entry, depth 1 being the root's children
+    """
+    if max_workers <= 1:
+        yield from _walk(entries, gitignore, sort=sort)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        top = []
+        for entry in entries:
+            name = entry.name
+            # Interned like the names _walk yields
+            if len(name) < INTERN_MAX_LENGTH:
+                name = sys.intern(name)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if should_ignore(name, "", is_dir, gitignore):
+                continue
+            future = None
+            if is_dir:
+                future = executor.submit(_scan, entry.path, gitignore, name + "/", sort)
+            top.append((name, is_dir, future))
+
+        for name, is_dir, future in top:
+            yield 1, name, is_dir
+            if future is not None:
+                depths, names, dirs = future.result()
+                for depth, child, child_is_dir in zip(depths, names, dirs):
+                    yield depth + 1, child, bool(child_is_dir)
 
 
 def build_tree(
     path: str,
-    base_path: str,
-    gitignore: Optional[pathspec.PathSpec] = None,
-    is_root: bool = True,
+    gitignore: Optional[re.Pattern] = None,
+    max_workers: int = MAX_WORKERS,
+    sort: bool = True,
 ) -> Dict[str, Any]:
     """
     Build directory tree structure
 
     Args:
-        path: Directory path to traverse
-        base_path: Base directory path containing .gitignore
-        gitignore: PathSpec object from .gitignore
-        is_root: Whether this is the root directory
+        path: Directory path to traverse, also the base of .gitignore rules
+        gitignore: Compiled .gitignore patterns from read_gitignore
+        max_workers: Number of threads scanning subdirectories
+        sort: Whether to sort children by name; unsorted output skips
+            sorting large directories when the consumer orders it anyway
 
     Returns:
         Dictionary representing directory tree
+
+    Raises:
+        FileNotFoundError: If path can't be resolved (see _list_root)
     """
-    # Check if path should be ignored
-    if should_ignore(path, base_path, gitignore):
-        return None
+    name = os.path.abspath(path)
+    try:
+        entries = _list_root(path, sort)
+    except NotADirectoryError:
+        return {"name": name, "type": _FILE}
+
+    root = {"name": name, "type": _DIR, "children": []}
+    # children lists of the open directories, indexed by depth - 1
+    stack = [root["children"]]
+    push = stack.append
+    file_type = _FILE
+    dir_type = _DIR
+
+    for depth, name, is_dir in _walk_tree(entries, gitignore, max_workers, sort):
+        del stack[depth:]
+        if is_dir:
+            children = []
+            stack[depth - 1].append(
+                {"name": name, "type": dir_type, "children": children}
+            )
+            push(children)
+        else:
+            stack[depth - 1].append({"name": name, "type": file_type})
+
+    return root
+
+
+def dump_tree(
+    path: str,
+    gitignore: Optional[re.Pattern] = None,
+    max_workers: int = MAX_WORKERS,
+    sort: bool = True,
+) -> str:
+    """
+    Build directory tree structure as a JSON string
 
-    name = os.path.abspath(path) if is_root else os.path.basename(path)
+    With orjson installed, the tree is built as dictionaries and serialized
+    by orjson in C. Otherwise the JSON text is written while walking,
+    without building the dictionaries first. Either way the output is
+    identical to
+    ``json.dumps(build_tree(path, gitignore), indent=2, ensure_ascii=False)``.
 
-    if os.path.isfile(path):
-        return {"name": name, "type": "file"}
+    Args:
+        path: Directory path to traverse, also the base of .gitignore rules
+        gitignore: Compiled .gitignore patterns from read_gitignore
+        max_workers: Number of threads scanning subdirectories
+        sort: Whether to sort children by name; unsorted output skips
+            sorting large directories when the consumer orders it anyway
 
-    result = {"name": name, "type": "directory", "children": []}
+    Returns:
+        JSON string representing directory tree
 
+    Raises:
+        FileNotFoundError: If path can't be resolved (see _list_root)
+    """
+    if orjson is not None:
+        return _dumps(build_tree(path, gitignore, max_workers, sort))
+
+    name = os.path.abspath(path)
     try:
-        items = os.listdir(path)
-        for item in sorted(items):
-            item_path = os.path.join(path, item)
-            child = build_tree(item_path, base_path, gitignore, is_root=False)
-            if child:
-                result["children"].append(child)
-    except PermissionError:
-        pass
+        entries = _list_root(path, sort)
+    except NotADirectoryError:
+        return _dumps({"name": name, "type": _FILE})
+
+    parts = [
+        '{\n  "name": ',
+        encode_basestring(name),
+        ',\n  "type": "directory",\n  "children": [',
+    ]
+    # Depth of the innermost open directory (0 is the root), and whether
+    # nothing has been written into its children list yet
+    level = 0
+    empty = True
+    write = parts.append
+    encode = encode_basestring
+    close_directory = _close_directory
+
+    for depth, name, is_dir in _walk_tree(entries, gitignore, max_workers, sort):
+        while level >= depth:
+            write(close_directory(level, empty))
+            level -= 1
+            empty = False
+
+        brace = "\n" + "    " * depth
+        key = brace + "  "
+        write(brace if empty else "," + brace)
+        write("{" + key + '"name": ')
+        write(encode(name))
+        if is_dir:
+            write("," + key + '"type": "directory",' + key + '"children": [')
+            level = depth
+            empty = True
+        else:
+            write("," + key + '"type": "file"' + brace + "}")
+            empty = False
+
+    while level >= 0:
+        write(close_directory(level, empty))
+        level -= 1
+        empty = False
+
+    return "".join(parts)
+
+
+def _dumps(obj: Any) -> str:
+    """
+    Serialize an object as indented JSON
+
+    orjson is used when it is installed, and its output is the same as
+    ``json.dumps(obj, indent=2, ensure_ascii=False)``.
+
+    Args:
+        obj: Object to serialize
+
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+        except orjson.JSONEncodeError:
+            # orjson rejects strings that aren't valid UTF-8, such as file
+            # names with undecodable bytes; json can still write them
+            pass
+    return json.dumps(obj, indent=2, ensure_ascii=False)
 
-    return result
+
+def _close_directory(depth: int, empty: bool) -> str:
+    """
+    Closing JSON text of a directory node written by dump_tree
+
+    Args:
+        depth: Depth of the directory (0 is the root)
+        empty: Whether its children list is empty
+
+    Returns:
+        Text closing the children list and the directory object
+    """
+    brace = "\n" + "    " * depth
+    if empty:
+        return "]" + brace + "}"
+    return brace + "  ]" + brace + "}"
 
 
 @mcp.prompt()
@@ -120,13 +576,13 @@ async def src_tree(directory: str) -> str:
     Returns:
         JSON string representing the file tree
     """
-    if not os.path.exists(directory):
-        return json.dumps({"error": "directory not found"}, indent=2)
-
-    gitignore = read_gitignore(directory)
-    tree = build_tree(directory, directory, gitignore)
-
-    return json.dumps(tree, indent=2, ensure_ascii=False)
+    try:
+        gitignore = read_gitignore(directory)
+        return dump_tree(directory, gitignore)
+    except FileNotFoundError:
+        # Raised by _list_root when the root can't be resolved; other
+        # errors are real failures and propagate
+        return _dumps({"error": "directory not found"})
 
 
 @mcp.tool()
@@ -135,13 +591,13 @@ async def get_src_tree(directory: str) -> str:
     Generate a file tree for the specified directory, filtering files based on .gitignore.
     Traverses the filesystem and generates a JSON-formatted tree structure that preserves hierarchy.
     """
-    if not os.path.exists(directory):
-        return json.dumps({"error": "directory not found"}, indent=2)
-
-    gitignore = read_gitignore(directory)
-    tree = build_tree(directory, directory, gitignore)
-
-    return json.dumps(tree, indent=2, ensure_ascii=False)
+    try:
+        gitignore = read_gitignore(directory)
+        return dump_tree(directory, gitignore)
+    except FileNotFoundError:
+        # Raised by _list_root when the root can't be resolved; other
+        # errors are real failures and propagate
+        return _dumps({"error": "directory not found"})
 
 
 if __name__ == "__main__":